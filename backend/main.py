@@ -1,16 +1,15 @@
 from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Dict, Any
-import fitz  # PyMuPDF
 from normalize import normalize_tables
-import requests
-import json
-import tempfile
+import pdf_service
+from pdf_service import MAX_TEXT_LENGTH, MIN_OCR_CHARS, extract_text_from_pdf, send_text_to_olmocr
+import orjson
+import asyncio
 import os
 import logging
-from pathlib import Path
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -39,7 +38,8 @@ class ProcessingResult(BaseModel):
 app = FastAPI(
     title="PDF OCR Processing API",
     description="Extract text from PDFs and process with olmocr-7b model",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # Add CORS middleware
@@ -51,83 +51,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Configuration
-OLMOCR_API_URL = "http://127.0.0.1:1234/v1/chat/completions"
-MAX_TEXT_LENGTH = 4000
+# Shared HTTP client, PDF worker pool, and OCR cache live in pdf_service
+@app.on_event("startup")
+async def startup():
+    await pdf_service.startup()
 
-def extract_text_from_pdf(pdf_path: str) -> str:
-    """Extracts all text from the given PDF file."""
-    text = ""
-    try:
-        doc = fitz.open(pdf_path)
-        for page in doc:
-            text += page.get_text()
-        doc.close()
-        return text.strip()
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Error extracting text from PDF: {str(e)}")
-
-def send_text_to_olmocr(text: str) -> dict:
-    """Sends extracted PDF text to olmocr-7b-0225-preview via LM Studio API."""
-    logger.info(f"Sending text to OCR API (length: {len(text)})")
-    headers = {"Content-Type": "application/json"}
-    
-    payload = {
-        "model": "olmocr-7b-0225-preview",
-        "messages": [
-            {
-                "role": "system",
-                "content": (
-                    "- entities: Names, Dates, Addresses\n"
-                    "- tables: headers and rows\n\n"
-                    "Respond in this JSON format:\n"
-                    "{\n"
-                    '  "entities": {\n    "names": [],\n    "dates": [],\n    "addresses": []\n  },\n'
-                    '  "tables": [ { "headers": [], "rows": [] } ]\n}'
-                )
-            },
-            {
-                "role": "user",
-                "content": text[:MAX_TEXT_LENGTH]  # Limit very long PDF input
-            }
-        ],
-        "temperature": 0.3,
-        "max_tokens": 2048
-    }
-    
-    try:
-        logger.info(f"Making request to {OLMOCR_API_URL}")
-        response = requests.post(OLMOCR_API_URL, headers=headers, json=payload, timeout=30)
-        
-        if response.status_code == 200:
-            response_data = response.json()
-            logger.info("OCR API request successful")
-            # Validate response structure
-            if not isinstance(response_data, dict):
-                logger.error("OCR API returned invalid response format")
-                raise HTTPException(
-                    status_code=500,
-                    detail="OCR API returned invalid response format"
-                )
-            return response_data
-        else:
-            logger.error(f"OCR API request failed with status {response.status_code}: {response.text}")
-            raise HTTPException(
-                status_code=500, 
-                detail=f"OCR API request failed: {response.status_code} - {response.text}"
-            )
-    except requests.exceptions.Timeout:
-        logger.error("OCR API request timed out")
-        raise HTTPException(status_code=500, detail="OCR API request timed out")
-    except requests.exceptions.ConnectionError:
-        logger.error("Cannot connect to OCR API")
-        raise HTTPException(status_code=500, detail="Cannot connect to OCR API. Make sure LM Studio is running on port 1234")
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Request exception: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error connecting to OCR API: {str(e)}")
-    except json.JSONDecodeError:
-        logger.error("OCR API returned invalid JSON response")
-        raise HTTPException(status_code=500, detail="OCR API returned invalid JSON response")
+@app.on_event("shutdown")
+async def shutdown():
+    await pdf_service.shutdown()
 
 @app.get("/")
 async def root():
@@ -145,83 +76,82 @@ async def root():
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
-    try:
-        # Test OCR API connection
-        test_response = requests.get("http://127.0.0.1:1234/v1/models", timeout=5)
-        ocr_status = "online" if test_response.status_code == 200 else "offline"
-    except:
-        ocr_status = "offline"
-    
+    ocr_status = "online" if await pdf_service.check_ocr_api() else "offline"
+
     return {
         "status": "healthy",
         "ocr_api_status": ocr_status,
         "max_text_length": MAX_TEXT_LENGTH
     }
 
+async def _validate_pdf(file: UploadFile) -> bytes:
+    """Validates that the upload is a PDF and returns its content.
+
+    Checks the declared content type and the %PDF- magic bytes, so non-PDF
+    uploads are rejected after reading five bytes instead of the whole body.
+    """
+    if file.content_type != "application/pdf":
+        raise HTTPException(status_code=400, detail="Only PDF files are allowed")
+    head = await file.read(5)
+    if head != b"%PDF-":
+        raise HTTPException(status_code=400, detail="File is not a valid PDF")
+    return head + await file.read()
+
 @app.post("/upload-pdf")
 async def upload_pdf(file: UploadFile = File(...)):
     """Upload and extract text from PDF file."""
-    if not file.filename.lower().endswith('.pdf'):
-        raise HTTPException(status_code=400, detail="Only PDF files are allowed")
-    
+    data = await _validate_pdf(file)
+
     try:
-        # Save uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-            content = await file.read()
-            tmp_file.write(content)
-            tmp_file_path = tmp_file.name
-        
-        # Extract text
-        extracted_text = extract_text_from_pdf(tmp_file_path)
-        
-        # Clean up temporary file
-        os.unlink(tmp_file_path)
-        
+        extracted_text = await extract_text_from_pdf(data)
+
         return {
             "success": True,
             "filename": file.filename,
             "text_length": len(extracted_text),
             "extracted_text": extracted_text[:1000] + "..." if len(extracted_text) > 1000 else extracted_text
         }
-        
+
+    except HTTPException:
+        raise
     except Exception as e:
-        # Clean up temporary file if it exists
-        if 'tmp_file_path' in locals():
-            try:
-                os.unlink(tmp_file_path)
-            except:
-                pass
         raise HTTPException(status_code=500, detail=f"Error processing PDF: {str(e)}")
 
 @app.post("/process-pdf", response_model=ProcessingResult)
 async def process_pdf(file: UploadFile = File(...)):
     """Upload PDF, extract text, and process with OCR model."""
     logger.info(f"Processing PDF file: {file.filename}")
-    
-    if not file.filename.lower().endswith('.pdf'):
-        raise HTTPException(status_code=400, detail="Only PDF files are allowed")
-    
-    tmp_file_path = None
+
+    data = await _validate_pdf(file)
+
     try:
-        # Save uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-            content = await file.read()
-            tmp_file.write(content)
-            tmp_file_path = tmp_file.name
-        
-        logger.info(f"Extracting text from PDF: {tmp_file_path}")
-        # Extract text from PDF
-        extracted_text = extract_text_from_pdf(tmp_file_path)
+        logger.info(f"Extracting text from PDF: {file.filename}")
+        # Warm the OCR API connection while extraction runs in the pool
+        extracted_text, _ = await asyncio.gather(
+            extract_text_from_pdf(data),
+            pdf_service.warm_up_ocr_api()
+        )
         
         if not extracted_text:
             logger.warning("No text found in PDF")
             raise HTTPException(status_code=400, detail="No text found in PDF")
-        
+
+        if len(extracted_text) < MIN_OCR_CHARS:
+            # Too little text to hold any entities or tables; skip the model
+            logger.info("Extracted text below OCR threshold, returning empty result")
+            return ProcessingResult(
+                success=True,
+                ocr_result=OCRResponse(
+                    entities=EntityData(names=[], dates=[], addresses=[]),
+                    tables=[]
+                )
+            )
+
         logger.info(f"Extracted text length: {len(extracted_text)}")
         
         # Process with OCR model
         try:
-            ocr_response = send_text_to_olmocr(extracted_text)
+            ocr_response = await send_text_to_olmocr(extracted_text)
         except HTTPException as e:
             # Re-raise HTTPException to maintain proper error handling
             logger.error(f"OCR processing failed: {str(e)}")
@@ -246,7 +176,7 @@ async def process_pdf(file: UploadFile = File(...)):
                 raise ValueError("No content in OCR response")
             
             logger.info("Parsing OCR response content")
-            parsed_content = json.loads(content)
+            parsed_content = orjson.loads(content)
             parsed_content = normalize_tables(parsed_content)
             
             # Validate and structure the response
@@ -270,16 +200,13 @@ async def process_pdf(file: UploadFile = File(...)):
                 ocr_result=ocr_result
             )
             
-        except (KeyError, json.JSONDecodeError, ValueError) as e:
+        except (KeyError, orjson.JSONDecodeError, ValueError) as e:
+            # JSON mode makes this unreachable in practice; treat it as a
+            # server error rather than a successful-looking response
             logger.error(f"Failed to parse OCR response: {str(e)}; Raw content: {content}")
-            # If parsing fails, return raw response
-            return ProcessingResult(
-                success=False,
-                ocr_result=OCRResponse(
-                    entities=EntityData(names=[], dates=[], addresses=[]),
-                    tables=[]
-                ),
-                error=f"Failed to parse OCR response: {str(e)}; Raw content: {content}"
+            raise HTTPException(
+                status_code=500,
+                detail=f"Failed to parse OCR response: {str(e)}"
             )
         
     except HTTPException:
@@ -295,26 +222,28 @@ async def process_pdf(file: UploadFile = File(...)):
             ),
             error=str(e)
         )
-    
-    finally:
-        # Clean up temporary file
-        if tmp_file_path and os.path.exists(tmp_file_path):
-            try:
-                os.unlink(tmp_file_path)
-                logger.info(f"Cleaned up temporary file: {tmp_file_path}")
-            except:
-                pass
 
 @app.post("/process-text")
 async def process_text(text: str):
     """Process raw text with OCR model (alternative endpoint)."""
     if not text.strip():
         raise HTTPException(status_code=400, detail="Text cannot be empty")
-    
+
+    if len(text.strip()) < MIN_OCR_CHARS:
+        # Too little text to hold any entities or tables; skip the model
+        return {
+            "success": True,
+            "input_text": text,
+            "parsed_result": {
+                "entities": {"names": [], "dates": [], "addresses": []},
+                "tables": []
+            }
+        }
+
     try:
         # Process with OCR model
         try:
-            ocr_response = send_text_to_olmocr(text)
+            ocr_response = await send_text_to_olmocr(text)
         except HTTPException as e:
             # Re-raise HTTPException to maintain proper error handling
             raise e
@@ -333,7 +262,7 @@ async def process_text(text: str):
             if not content:
                 raise ValueError("No content in OCR response")
                 
-            parsed_content = json.loads(content)
+            parsed_content = orjson.loads(content)
             parsed_content = normalize_tables(parsed_content)
             return {
                 "success": True,
@@ -341,13 +270,13 @@ async def process_text(text: str):
                 "parsed_result": parsed_content
             }
             
-        except (KeyError, json.JSONDecodeError, ValueError) as e:
-            return {
-                "success": False,
-                "input_text": text,
-                "raw_response": ocr_response,
-                "error": f"Failed to parse OCR response: {str(e)}"
-            }
+        except (KeyError, orjson.JSONDecodeError, ValueError) as e:
+            # JSON mode makes this unreachable in practice; treat it as a
+            # server error rather than a successful-looking response
+            raise HTTPException(
+                status_code=500,
+                detail=f"Failed to parse OCR response: {str(e)}"
+            )
             
     except HTTPException:
         # Re-raise HTTPException to maintain proper error handling
@@ -357,4 +286,17 @@ async def process_text(text: str):
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    if os.environ.get("DEBUG"):
+        # Development: single worker with auto-reload
+        uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
+    else:
+        # Production: one worker per core, uvloop + httptools (both ship
+        # with uvicorn[standard]) for faster event loop and HTTP parsing
+        uvicorn.run(
+            "main:app",
+            host="0.0.0.0",
+            port=8000,
+            workers=os.cpu_count(),
+            loop="uvloop",
+            http="httptools"
+        )
\ No newline at end of file
@@ -1,22 +1,21 @@
 def normalize_tables(parsed_content):
     """
-    Recursively convert all table cell values to strings in the parsed_content dict.
+    Convert all table header/cell values to strings in the parsed_content dict.
     This ensures compatibility with Pydantic TableData model.
+
+    Mutates parsed_content in place (the caller owns the freshly parsed dict)
+    and skips rows that are already all-string, the common case from the model.
     """
-    if not parsed_content or "tables" not in parsed_content:
+    tables = parsed_content.get("tables") if parsed_content else None
+    if not tables:
         return parsed_content
-    tables = parsed_content["tables"]
-    normalized_tables = []
     for table in tables:
-        # Normalize headers
-        headers = [str(h) for h in table.get("headers", [])]
-        # Normalize rows
-        rows = [ [str(cell) for cell in row] for row in table.get("rows", []) ]
-        normalized_tables.append({
-            **table,
-            "headers": headers,
-            "rows": rows
-        })
-    parsed_content = dict(parsed_content)
-    parsed_content["tables"] = normalized_tables
+        headers = table.get("headers")
+        if headers and not all(type(h) is str for h in headers):
+            table["headers"] = [h if type(h) is str else str(h) for h in headers]
+        rows = table.get("rows")
+        if rows:
+            table["rows"] = [row if all(type(cell) is str for cell in row)
+                             else list(map(str, row))
+                             for row in rows]
     return parsed_content
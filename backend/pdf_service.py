@@ -0,0 +1,184 @@
+"""Shared PDF extraction and OCR state for the API.
+
+Holds the process-wide httpx client, PDF worker pool, and OCR response
+cache so every endpoint reuses the same connections, workers, and cache.
+"""
+from fastapi import HTTPException
+import fitz  # PyMuPDF
+import httpx
+import orjson
+import asyncio
+import hashlib
+import os
+import logging
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+OLMOCR_API_BASE = "http://127.0.0.1:1234"
+OLMOCR_COMPLETIONS_PATH = "/v1/chat/completions"
+MAX_TEXT_LENGTH = 4000
+MIN_OCR_CHARS = 20  # below this there is nothing for the model to extract
+PARALLEL_PAGE_THRESHOLD = 8  # below this, fork overhead outweighs the speedup
+
+# Worker processes for CPU-bound PDF text extraction (lazy: workers are
+# only spawned on first use)
+_pdf_pool = ProcessPoolExecutor(max_workers=os.cpu_count())
+
+# LRU cache of OCR responses keyed by SHA-256 of the (truncated) prompt
+# text: hashing costs microseconds, model inference costs seconds
+OCR_CACHE_SIZE = 256
+_ocr_cache: "OrderedDict[str, dict]" = OrderedDict()
+
+# Static system message, built once instead of per request
+_SYSTEM_MSG = {
+    "role": "system",
+    "content": (
+        "- entities: Names, Dates, Addresses\n"
+        "- tables: headers and rows\n\n"
+        "Respond in this JSON format:\n"
+        "{\n"
+        '  "entities": {\n    "names": [],\n    "dates": [],\n    "addresses": []\n  },\n'
+        '  "tables": [ { "headers": [], "rows": [] } ]\n}'
+    )
+}
+
+# Shared async HTTP client with keep-alive and connection pooling so OCR
+# calls reuse sockets and don't block the event loop during inference
+_client: httpx.AsyncClient = None
+
+async def startup():
+    """Opens the shared HTTP client. Called from the app startup event."""
+    global _client
+    _client = httpx.AsyncClient(
+        base_url=OLMOCR_API_BASE,
+        timeout=30.0,
+        limits=httpx.Limits(max_keepalive_connections=16, max_connections=32)
+    )
+
+async def shutdown():
+    """Releases the HTTP client and worker pool. Called from the app shutdown event."""
+    await _client.aclose()
+    _pdf_pool.shutdown()
+
+async def warm_up_ocr_api():
+    """Pings /v1/models to keep a pooled connection to LM Studio hot.
+
+    Meant to run concurrently with PDF extraction so the OCR POST that
+    follows reuses a ready connection; failures are ignored here and
+    surface on the real request instead.
+    """
+    try:
+        await _client.get("/v1/models", timeout=5)
+    except Exception:
+        pass
+
+async def check_ocr_api() -> bool:
+    """Returns True if the LM Studio API answers the /v1/models probe."""
+    try:
+        response = await _client.get("/v1/models", timeout=5)
+        return response.status_code == 200
+    except Exception:
+        return False
+
+def _extract_page_range(data: bytes, start: int, stop: int) -> str:
+    """Extracts text from pages [start, stop) of the given PDF bytes."""
+    parts = []
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        for page_num in range(start, stop):
+            parts.append(doc[page_num].get_text("text", sort=False))
+    return "".join(parts)
+
+async def extract_text_from_pdf(data: bytes) -> str:
+    """Extracts all text from the given PDF bytes in worker processes.
+
+    Extraction is CPU-bound inside MuPDF, so it always runs in the process
+    pool to keep the event loop responsive; large documents are split into
+    page ranges extracted in parallel.
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        # Opening only parses the xref table, cheap enough for the event loop
+        with fitz.open(stream=data, filetype="pdf") as doc:
+            page_count = doc.page_count
+
+        if page_count < PARALLEL_PAGE_THRESHOLD:
+            text = await loop.run_in_executor(_pdf_pool, _extract_page_range, data, 0, page_count)
+        else:
+            chunk_size = -(-page_count // (os.cpu_count() or 1))  # ceil division
+            futures = [
+                loop.run_in_executor(_pdf_pool, _extract_page_range,
+                                     data, start, min(start + chunk_size, page_count))
+                for start in range(0, page_count, chunk_size)
+            ]
+            text = "".join(await asyncio.gather(*futures))
+        return text.strip()
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error extracting text from PDF: {str(e)}")
+
+async def send_text_to_olmocr(text: str) -> dict:
+    """Sends extracted PDF text to olmocr-7b-0225-preview via LM Studio API."""
+    logger.info(f"Sending text to OCR API (length: {len(text)})")
+    prompt = text[:MAX_TEXT_LENGTH]  # Limit very long PDF input, sliced once
+    text_hash = hashlib.sha256(prompt.encode()).hexdigest()
+    cached = _ocr_cache.get(text_hash)
+    if cached is not None:
+        _ocr_cache.move_to_end(text_hash)
+        logger.info("OCR cache hit, skipping model call")
+        return cached
+
+    headers = {"Content-Type": "application/json", "Connection": "keep-alive"}
+
+    payload = {
+        "model": "olmocr-7b-0225-preview",
+        "messages": [
+            _SYSTEM_MSG,
+            {"role": "user", "content": prompt}
+        ],
+        "temperature": 0.3,
+        "max_tokens": 1024,
+        # Constrain decoding to valid JSON so parsing downstream can't fail
+        "response_format": {"type": "json_object"}
+    }
+
+    try:
+        logger.info(f"Making request to {OLMOCR_API_BASE}{OLMOCR_COMPLETIONS_PATH}")
+        # Pre-encode with orjson and send raw bytes, skipping httpx's
+        # slower stdlib-json serialization of the payload
+        body = orjson.dumps(payload)
+        response = await _client.post(OLMOCR_COMPLETIONS_PATH, headers=headers, content=body)
+
+        if response.status_code == 200:
+            response_data = orjson.loads(response.content)
+            logger.info("OCR API request successful")
+            # Validate response structure
+            if not isinstance(response_data, dict):
+                logger.error("OCR API returned invalid response format")
+                raise HTTPException(
+                    status_code=500,
+                    detail="OCR API returned invalid response format"
+                )
+            _ocr_cache[text_hash] = response_data
+            if len(_ocr_cache) > OCR_CACHE_SIZE:
+                _ocr_cache.popitem(last=False)
+            return response_data
+        else:
+            logger.error(f"OCR API request failed with status {response.status_code}: {response.text}")
+            raise HTTPException(
+                status_code=500,
+                detail=f"OCR API request failed: {response.status_code} - {response.text}"
+            )
+    except httpx.TimeoutException:
+        logger.error("OCR API request timed out")
+        raise HTTPException(status_code=500, detail="OCR API request timed out")
+    except httpx.ConnectError:
+        logger.error("Cannot connect to OCR API")
+        raise HTTPException(status_code=500, detail="Cannot connect to OCR API. Make sure LM Studio is running on port 1234")
+    except httpx.RequestError as e:
+        logger.error(f"Request exception: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error connecting to OCR API: {str(e)}")
+    except orjson.JSONDecodeError:
+        logger.error("OCR API returned invalid JSON response")
+        raise HTTPException(status_code=500, detail="OCR API returned invalid JSON response")